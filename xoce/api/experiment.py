@@ -4,11 +4,13 @@
 
 from codecs import decode
 import copy
+import functools
 import os
 import numpy as np
 import xarray as xr
 
 from ..calc import CalcManager
+from ..utils.cache_util import BoundedCache
 from ..utils.dataset_util import check_dims, get_dim_axis 
 from ..utils.datetime_util import decode_months_since
 from ..utils.io_util import extract_cmip6_variables, get_filename_from_drs
@@ -17,6 +19,24 @@ from ..utils.io_util import load_cmip6_output
 from . import _DIM_COORDINATES, _VARS_NAME
 
 
+@functools.lru_cache(maxsize=32)
+def _cached_cmip6_output(path, mtime):
+    return load_cmip6_output(path)
+
+
+def _load_cmip6_output(path):
+    """
+    Cached version of load_cmip6_output. The directory is scanned again only
+    if it has been modified (files added, removed or renamed).
+    """
+    if not os.path.isdir(path):
+        return load_cmip6_output(path)
+
+    drs = _cached_cmip6_output(path, os.stat(path).st_mtime_ns)
+
+    # copy lists so that the cached dictionary is never modified
+    return {k: list(v) for k, v in drs.items()}
+
 
 class Experiment:
     def __init__(self, path=None, interpolation='linear'):
@@ -31,6 +51,7 @@ class Experiment:
 
         self._arrays = dict()                     # dict-like (could be xr.Dataset) obj
         self._mesh = xr.Dataset()                 # dict-like (should be xr.Dataset) obj
+        self._mesh_options = (dict(), dict())     # mesh 'replace_dict' and 'rename'
         self._calc = CalcManager(dataset=self)    # instance to compute off-line diag.
 
         # loading and array options
@@ -39,13 +60,32 @@ class Experiment:
         self._decode_times = None                 # decode dim 'times' when loading files
         self._unused_dims  = list()
 
+        # renaming rules of the experiment type (eg: 'lev' -> 'depth')
+        self._vars_name      = _VARS_NAME.get(type(self).__name__, dict())
+        self._vars_name_keys = frozenset(self._vars_name)
+
+        # coordinate comparisons cache (see _coord_matches)
+        self._coord_match  = BoundedCache(maxsize=64)
+
+
+    def __contains__(self, var):
+        # same as `var in self.variables` without building the list
+        return (var in self._arrays or var in self.mesh.data_vars or
+                var in self.coords)
 
     def __getitem__(self, var):
-        if var in self.variables:
+        # stored variables are returned as stored, without interpolation (as before)
+        if var in self.arrays and not self._unused_dims:
+            array = self.arrays[var]
+            if not self.interpolation:
+                return array
+            return self._astype(array)
+
+        if var in self:
             if var in self.arrays:
                 array = self.arrays[var]
-            elif var in self._mesh.variables:
-                array = self._mesh[var]
+            elif var in self.mesh.variables:
+                array = self.mesh[var]
             elif var in self.coords:
                 array = self.coords[var]
             else:
@@ -72,25 +112,11 @@ class Experiment:
         if not self.interpolation:
             return array
         else:
-            method = self.interpolation
-            for d in array.dims :
-                c = _DIM_COORDINATES.get(d, d)
-                if c in self.coords:
-                    if not np.all(array[d].data == self.coords[c][d].data):
-                        array = array.interp(**{d: self.coords[c]}, method=method,
-                                            kwargs={"fill_value": "extrapolate"})
+            array = self._interpolate(array)
 
         self.add_variable(var, array)
-        array = self.arrays[var]
-        
-        if self.dtype and array.dtype != self.dtype:
-            print(array.name, self.dtype)
-            try:
-                array = array.astype(self.dtype)
-            except TypeError:
-                pass
 
-        return array
+        return self._astype(self.arrays[var])
 
 
     def __setitem__(self, var, values):
@@ -106,11 +132,22 @@ class Experiment:
         raise Exception("'load' function not implemented.")
 
     def load_mesh(self, fmesh, replace_dict={}, rename={}):
+        """
+        Set the mesh file of the experiment. The file is opened the first
+        time the mesh is queried (see the `mesh` property).
+        """
         if not os.path.isfile(fmesh):
             raise Exception("Mesh file '{}' not found.".format(fmesh))
         
+        self.fmesh = fmesh
+        self._mesh = None
+        self._mesh_options = (replace_dict, rename)
+
+    def _open_mesh(self):
+        replace_dict, rename = self._mesh_options
+
         # open the mesh dataset
-        mesh = xr.open_dataset(fmesh)
+        mesh = xr.open_dataset(self.fmesh)
 
         # replace some variables values
         for var in replace_dict:
@@ -123,9 +160,7 @@ class Experiment:
         if rename:
             mesh = mesh.rename(**rename)
 
-        # save object attributes
-        self._mesh = mesh
-        self.fmesh = fmesh
+        return mesh
 
 
     @property
@@ -141,6 +176,24 @@ class Experiment:
 
         self._dtype = value
 
+    def _astype(self, array):
+        """
+        Cast `array` into the experiment data type (if any).
+        """
+        if self.dtype and array.dtype != self.dtype:
+            try:
+                array = array.astype(self.dtype)
+            except TypeError:
+                pass
+
+        return array
+
+    @property
+    def mesh(self):
+        if self._mesh is None:
+            self._mesh = self._open_mesh()
+        return self._mesh
+
     @property
     def dims(self):
         return self._dims
@@ -163,8 +216,46 @@ class Experiment:
 
     @property
     def variables(self):
-        return list( set( list(self._arrays) + list(self._mesh) + list(self.coords) ) ) 
+        return list( set( list(self._arrays) + list(self.mesh) + list(self.coords) ) ) 
+
 
+    def _coord_matches(self, array, d, c):
+        """
+        Check if the dimension `d` of `array` has the same values as the
+        experiment coordinate `c`. Only comparisons between index coordinates
+        are memoized: dimensions without index get a new range at each call.
+        """
+        dvar = array[d].variable
+        cvar = self.coords[c][d].variable
+        if dvar is cvar:
+            return True
+
+        if not (d in array.indexes and d in self.coords[c].indexes):
+            return dvar.shape == cvar.shape and np.array_equal(dvar.data, cvar.data)
+
+        key    = (id(dvar), id(cvar))
+        cached = self._coord_match.get(key)
+        if cached is None:
+            # variables are kept with the result so that their id cannot be reused
+            match  = dvar.shape == cvar.shape and np.array_equal(dvar.data, cvar.data)
+            cached = (dvar, cvar, match)
+            self._coord_match[key] = cached
+
+        return cached[2]
+
+    def _interpolate(self, array):
+        """
+        Interpolate `array` on the experiment coordinates if they differ.
+        """
+        method = self.interpolation
+        for d in array.dims :
+            c = _DIM_COORDINATES.get(d, d)
+            if c in self.coords:
+                if not self._coord_matches(array, d, c):
+                    array = array.interp(**{d: self.coords[c]}, method=method,
+                                         kwargs={"fill_value": "extrapolate"})
+
+        return array
 
     def calculate(self, var):
         return self._calc.calculate(var)
@@ -184,25 +275,24 @@ class Experiment:
         
         for v in self.variables:
             if v not in dataset.dims:  
+                arr = self[v]
+
                 # check dimensions shape and size
-                if set(conds.dims) <= set(self[v].dims):
-                    indx, skpd = get_dim_axis(self, self[v].dims, skip_notfound=True)
+                if set(conds.dims) <= set(arr.dims):
+                    indx, skpd = get_dim_axis(self, arr.dims, skip_notfound=True)
                     
-                    var_shpe = np.delete(self[v].shape, skpd)
+                    var_shpe = np.delete(arr.shape, skpd)
                     shpe     = np.take(list(self.dims.values()), indx)
                     
-                    if np.all(shpe == var_shpe):
+                    if tuple(shpe) == tuple(var_shpe):
                         if drop:
-                            arr = self[v].where(conds, drop=drop)
+                            arr = arr.where(conds, drop=drop)
                         else:
-                            arr = self[v].where(conds, other, drop=drop)
-                        dataset[v] = (arr.dims, arr.data)
-                        dataset[v].attrs = arr.attrs
-
-                elif check_dims(self[v], dataset.dims):
-                    arr = self[v]
-                    dataset[v] = (arr.dims, arr.data)
-                    dataset[v].attrs = arr.attrs
+                            arr = arr.where(conds, other, drop=drop)
+                        dataset[v] = (arr.dims, arr.data, arr.attrs)
+
+                elif check_dims(arr, dataset.dims):
+                    dataset[v] = (arr.dims, arr.data, arr.attrs)
         
         return dataset
 
@@ -210,14 +300,25 @@ class Experiment:
         if isinstance(name_dict, dict):
             names = name_dict
         
+        # a single rename call per array with all the names it contains
+        if isinstance(self.arrays, dict):
+            arrays = dict()
+            for v, arr in self.arrays.items():
+                rename_dict = {k: n for k, n in names.items()
+                               if k in arr.dims or k in arr.coords}
+                if rename_dict:
+                    arr = arr.rename(rename_dict)
+                if v in names:
+                    v   = names[v]
+                    arr = arr.rename(v)
+                arrays[v] = arr
+            self.arrays = arrays
+        else:
+            rename_dict = {k: n for k, n in names.items() if k in self.arrays}
+            if rename_dict:
+                self.arrays = self.arrays.rename(rename_dict)
+
         for name in names:
-            if name in self.arrays:
-                if isinstance(self.arrays, dict):
-                    for v in self.arrays:
-                        if name in self.arrays[v]:
-                            self.arrays[v] = self.arrays[v].rename(**{name:names[name]})
-                else:
-                    self.arrays = self.arrays.rename(**{name:names[name]})
             if name in self._coords:
                 self._coords[names[name]] = self._coords[name]
                 del self._coords[name]
@@ -251,33 +352,40 @@ class Experiment:
         Warning: special treatment are made to get the real variable 
         name..
         """
-        if var in list(_VARS_NAME[type(self).__name__].keys()):
-            newvar = _VARS_NAME[type(self).__name__][var]
-        else:
-            newvar = var
+        newvar = self._vars_name.get(var, var)
 
-        if rename_dims:
-            rename_dict = dict()
-            for vn in _VARS_NAME[type(self).__name__]:
-                if vn in list(arr.dims) + list(arr.coords):
-                    rename_dict[vn] = _VARS_NAME[type(self).__name__][vn]
-            arr = arr.rename(rename_dict)
+        # already stored: nothing to rename
+        if newvar in self.arrays and not assign:
+            return newvar, self.arrays[newvar]
 
-            if arr.name in _VARS_NAME[type(self).__name__]:
-                arr.name = _VARS_NAME[type(self).__name__][arr.name]
+        if rename_dims:
+            arr = self._rename_array(arr)
 
-        if newvar not in list(self.arrays):
+        if newvar not in self.arrays:
             self.arrays[newvar] = arr
-        elif assign:
-            if isinstance(self.arrays, xr.Dataset):
-                self.arrays = self.arrays.assign({newvar: arr})
-            else:
-                self.arrays[newvar] = arr
+        elif isinstance(self.arrays, xr.Dataset):
+            self.arrays = self.arrays.assign({newvar: arr})
         else:
-            arr = self.arrays[newvar]
+            self.arrays[newvar] = arr
         
         return newvar, arr
 
+    def _rename_array(self, arr):
+        """
+        Apply the experiment renaming rules to the dims, coords and name of
+        `arr`. The input array is left unchanged.
+        """
+        dim_coords  = arr.dims + tuple(arr.coords)
+        rename_dict = {vn: self._vars_name[vn]
+                       for vn in self._vars_name_keys.intersection(dim_coords)}
+        if rename_dict:
+            arr = arr.rename(rename_dict)
+
+        if arr.name in self._vars_name_keys:
+            arr = arr.rename(self._vars_name[arr.name])
+
+        return arr
+
     def add_coordinate(self, var, arr, rename_dims=True, assign=False):
         """
         Add new coordinate in the private self._coords dictionary.
@@ -288,23 +396,13 @@ class Experiment:
         name..
         """           
 
-        if var in list(_VARS_NAME[type(self).__name__].keys()):
-            newvar = _VARS_NAME[type(self).__name__][var]
-        else:
-            newvar = var
+        newvar = self._vars_name.get(var, var)
 
         if isinstance(arr, np.ndarray):
             arr = xr.DataArray(arr, dims=(newvar))
 
         if rename_dims:
-            rename_dict = dict()
-            for vn in _VARS_NAME[type(self).__name__]:
-                if vn in list(arr.dims) + list(arr.coords):
-                    rename_dict[vn] = _VARS_NAME[type(self).__name__][vn]
-            arr = arr.rename(rename_dict)
-
-            if arr.name in _VARS_NAME[type(self).__name__]:
-                arr.name = _VARS_NAME[type(self).__name__][arr.name]
+            arr = self._rename_array(arr)
 
         if newvar not in self._coords:
             self._coords[newvar] = arr
@@ -344,18 +442,18 @@ class SingleDatasetExperiment(Experiment):
     def arrays(self, ds):
         self._arrays = ds
         self._coords = ds.coords
-        self._dims   = ds.dims
+        self._dims   = ds.sizes
 
     # abstract method(s) definition
     def load(self, chunks={}, replace_dict={}):
         """Loading output files."""
+        # chunks are set when opening files (no rechunk afterwards)
+        kwargs = dict(chunks=chunks or 'auto', parallel=True, combine='by_coords')
         try :
-            ds = xr.open_mfdataset(self.path)
+            ds = xr.open_mfdataset(self.path, **kwargs)
         except ValueError:
-            ds = xr.open_mfdataset(self.path, decode_times=False)
+            ds = xr.open_mfdataset(self.path, decode_times=False, **kwargs)
             ds = ds.assign_coords( {'time': decode_months_since(ds['time'])} )
-        
-        ds = ds.chunk(chunks)
 
         # replace some variables values
         for var in replace_dict:
@@ -366,16 +464,15 @@ class SingleDatasetExperiment(Experiment):
                 ds = ds.assign({var: ds[newvar]})
 
         # rename some vars, coords or dims
-        rename_dict = dict()
-        for v, n in _VARS_NAME[type(self).__name__].items():
-            if v in ds:
-                rename_dict[v] = n
-        ds = ds.rename(rename_dict)
+        rename_dict = {v: self._vars_name[v]
+                       for v in self._vars_name_keys.intersection(ds.variables)}
+        if rename_dict:
+            ds = ds.rename(rename_dict)
 
         # add into object placeholders
         self._arrays = ds
         self._coords = ds.coords
-        self._dims   = ds.dims
+        self._dims   = ds.sizes
 
 
 
@@ -395,19 +492,32 @@ class CMIPExperiment(Experiment):
         """Loading output files."""
 
         self._chunks = chunks
-        self._drs = load_cmip6_output(self.path)
+        self._drs = _load_cmip6_output(self.path)
 
 
+    @property
+    def _drs(self):
+        return self._drs_dict
+
+    @_drs.setter
+    def _drs(self, drs):
+        self._drs_dict = drs
+        # variable ids set kept in sync for membership tests
+        self._drs_vars = frozenset(drs.get('variable_id', []))
+
     @property
     def variables(self):
-        return list( set( super().variables + self._drs.get('variable_id', []) ) )
+        return list( set( super().variables ) | self._drs_vars )
+
+    def __contains__(self, var):
+        return super().__contains__(var) or var in self._drs_vars
 
     def load_variable(self, var, chunks={}, decode_times=None):
         if decode_times is False:
             self._decode_times = False
         
         if not self._drs :
-            self._drs = load_cmip6_output(self.path)
+            self._drs = _load_cmip6_output(self.path)
 
         if var not in self._drs['variable_id']:
             raise Exception("No file match `variable_id = {}`".format(var) + 
@@ -415,27 +525,26 @@ class CMIPExperiment(Experiment):
         
         var_drs = extract_cmip6_variables([var], 'variable_id', self._drs)
         var_tr  = sorted(var_drs['time_range'])
-        var_ind = var_drs['time_range'].index(var_tr[0])
 
-        fname   = get_filename_from_drs(var, {k: [var_drs[k][var_ind]] for k in var_drs})
-
-        abspath = os.path.join(self.path, fname[0])
-        ds = xr.open_dataset(abspath, chunks=chunks, decode_times=decode_times)
-
-        # -- concat time_range if necessary
-        for tr in var_tr[1:]:
+        abspaths = list()
+        for tr in var_tr:
             i       = var_drs['time_range'].index(tr)
             fname   = get_filename_from_drs(var, {k: [var_drs[k][i]] for k in var_drs})
+            abspaths.append(os.path.join(self.path, fname[0]))
 
-            abspath = os.path.join(self.path, fname[0])
-            new_ds  = xr.open_dataset(abspath, chunks=chunks, decode_times=decode_times)
+        if len(abspaths) == 1:
+            ds = xr.open_dataset(abspaths[0], chunks=chunks, decode_times=decode_times)
+        else:
+            # -- concat time_range files (time independent vars are not concatenated)
+            ds = xr.open_mfdataset(abspaths, chunks=chunks, decode_times=decode_times,
+                                   parallel=True, combine='nested', concat_dim='time',
+                                   data_vars='minimal', coords='minimal',
+                                   compat='override')
 
-            ds      = xr.concat( (ds, new_ds), dim='time')
-        
         # update experiment dims and coords
         for d in ds.dims:
             if d not in self.dims:
-                self._dims[d] = ds.dims[d]
+                self._dims[d] = ds.sizes[d]
         
         for c in ds.coords:
             if c not in self.coords:
@@ -28,7 +28,7 @@ class CalcManager:
         Calculate a variable by its name.
         """
 
-        if variable in self._dataset.variables:
+        if variable in self._dataset:
             return self._dataset[variable]
         
         if variable not in self._functions:
@@ -43,7 +43,7 @@ class CalcManager:
         args = list()
         lcls = list()
         for p in prms:
-            if p in self._dataset.variables:
+            if p in self._dataset:
                 args.append(self._dataset[p])
             elif not (prms[p].default == inspect._empty):
                 args.append(prms[p].default)
@@ -6,7 +6,42 @@ import numpy as np
 import xarray as xr
 
 from xoce.calc.formulas.constants import CONST
-from xoce.utils.dataset_util import array_diff, broadcast_like, concatenate_arrays
+from xoce.calc.kernels import nemo_bn2, nemo_eos_ts_coefs, teos10_rho
+from xoce.utils import cache_util
+from xoce.utils.dataset_util import array_diff, broadcast_like
+
+
+_PRESSURE_CACHE = cache_util.BoundedCache(maxsize=4)
+
+def _same_values(a, b):
+    """
+    Cheap equality of two arrays: lazy arrays are compared by their dask
+    name only, so that no computation is triggered.
+    """
+    if a is b:
+        return True
+    if isinstance(a, np.ndarray) and isinstance(b, np.ndarray):
+        return np.array_equal(a, b)
+    a_name = getattr(a, 'name', None)
+    return a_name is not None and a_name == getattr(b, 'name', None)
+
+def _pressure(depth):
+    """
+    Hydrostatic pressure term g*rho0*depth in [dbar]. Depth does not change
+    during an experiment, so the result is cached on the depth values (a
+    dtype cast gives a new depth variable at each access).
+    """
+    dvar = getattr(depth, 'variable', None)
+    if dvar is None:
+        return CONST.g*CONST.rho0*depth / 10**4
+
+    key    = (dvar.dims, dvar.shape, dvar.dtype)
+    cached = _PRESSURE_CACHE.get(key)
+    if cached is None or not _same_values(cached[0], dvar.data):
+        cached = (dvar.data, CONST.g*CONST.rho0*depth / 10**4)
+        _PRESSURE_CACHE[key] = cached
+
+    return cached[1]
 
 
 
@@ -17,8 +52,9 @@ class thetao:
     unit_long = 'degrees Celsius'
 
     def calculate(so, tis, depth, p_ref=CONST.p0):
-        p = CONST.g*CONST.rho0*depth
-        return gsw.conversions.pt_from_t(so, tis, p/10**4, p_ref/10**4)
+        p = _pressure(depth)
+        return xr.apply_ufunc(gsw.conversions.pt_from_t, so, tis, p, p_ref/10**4,
+                              dask='parallelized', output_dtypes=[np.float64])
 
 
 class bigthetao:
@@ -28,7 +64,8 @@ class bigthetao:
     unit_long = 'degrees Celsius'
 
     def calculate(so, thetao):
-        return gsw.conversions.CT_from_pt(so, thetao)
+        return xr.apply_ufunc(gsw.conversions.CT_from_pt, so, thetao,
+                              dask='parallelized', output_dtypes=[np.float64])
 
 
 class so:
@@ -38,8 +75,9 @@ class so:
     unit_long = 'grammes per kilogrammes of water'
 
     def calculate(sp, depth, longitude, latitude, p_ref=CONST.p0):
-        p = CONST.g*CONST.rho0*depth
-        return gsw.conversions.SA_from_SP(sp, p/10**4, longitude, latitude)
+        p = _pressure(depth)
+        return xr.apply_ufunc(gsw.conversions.SA_from_SP, sp, p, longitude,
+                              latitude, dask='parallelized', output_dtypes=[np.float64])
 
 
 class rho:
@@ -49,8 +87,9 @@ class rho:
     unit_long = 'kilogrammes per cube meter'
 
     def calculate(so, bigthetao, depth):
-        p = CONST.g*CONST.rho0*depth
-        return gsw.density.rho(so, bigthetao, p/10**4)
+        p = _pressure(depth)
+        return xr.apply_ufunc(teos10_rho, so, bigthetao, p, dask='parallelized',
+                              output_dtypes=[np.float64])
 
 
 class rho_star:
@@ -85,71 +124,24 @@ class N2:
         T = thetao
         S = so
 
-        n2 = xr.full_like(T, 1)
-        n2 = xr.where(np.isnan(T), np.nan, n2)
-        n2.name = 'N2'
-
-        rw = xr.full_like(T, 1)
-        rw.name = 'rw'
         rwd = (0.5*e3t)/array_diff(depth, dim='depth', method='backward')
 
         # filtering unwanted dim of len 1
-        while 1 in rwd.shape:
-            dim = rwd.dims[rwd.shape.index(1)]
-            rwd = rwd.isel({dim: 0})
+        rwd = rwd.squeeze()
 
-        # fill the rw array
-        for k in range(len(rwd)):
-            slicer = [slice(0, None, 1)] * len(rw.dims)
-            slicer[rw.dims.index('depth')] = slice(k, k+1, 1)
-            rw[tuple(slicer)] = rwd[k]
+        # rw only varies along depth: it is broadcast by apply_ufunc (coords
+        # are dropped to keep a positional matching along depth)
+        rw = xr.DataArray(rwd.data, dims=rwd.dims, name='rw')
 
         A, B = N2.__eos_ts_coefs(thetao, so, depth)
 
-        # reshape rw to match EOS coefs dimensions (create a function for this ?)
-        index = list()
-        for co in A.dims:
-            if co not in rw.dims:
-                rw = rw.expand_dims({co: A[co].size})
-            if co == 'depth':
-                index.append(slice(1,None,1))
-            else:
-                index.append(slice(0,None,1))
-        
-        # select thermal/haline coefficient and change 'depth' coordinates
-        A1 = A.isel({'depth': slice(0,-1,1)})
-        A1.coords['depth'] = A.coords['depth'][1:]
-        A1 = concatenate_arrays([A.isel({'depth': [0]}), A1], dim='depth', 
-                                chunks=A.chunks)
-
-        B1 = B.isel({'depth': slice(0,-1,1)})
-        B1.coords['depth'] = B.coords['depth'][1:]
-        B1 = concatenate_arrays([B.isel({'depth': [0]}), B1], dim='depth',
-                                chunks=B.chunks)
-
-        alpha = (1 - rw) * A1 + (rw * A)
-        beta  = (1 - rw) * B1 + (rw * B)
-
-        dT = array_diff(T, dim='depth', method='backward')
-        dS = array_diff(S, dim='depth', method='backward')
-
-        # calculate n2 for all depth except surface (index 0)
-        bn2 = -1*CONST.g * ( alpha * dT - beta * dS) / e3t
-        
-        # filter top / bottom boundaries
-        # -- backward : need to filter the bottom
-        slicers = [slice(0, None, 1)] * len(bn2.shape)
-        idepth  = bn2.dims.index('depth')
-        slicers[idepth]  = slice(-2, -1, 1)
-        slc = tuple(slicers)
-        
-        bn2[slc] = xr.where(np.isnan(bn2[slc]), np.nan, 0.)
-
-        # -- null value at surface
-        slicers[idepth]  = slice(0, 1, 1)
-        slc = tuple(slicers)
-
-        bn2[slc] = xr.where(np.isnan(bn2[slc]), np.nan, 0.)
+        # single pass over each water column (see kernels.nemo_bn2)
+        bn2 = xr.apply_ufunc(nemo_bn2, A, B, T, S, rw, e3t,
+                             input_core_dims=[['depth']]*6,
+                             output_core_dims=[['depth']], dask='parallelized',
+                             output_dtypes=[np.float64],
+                             dask_gufunc_kwargs={'allow_rechunk': True})
+        bn2 = bn2.transpose(*T.dims, ...)
 
         return bn2
 
@@ -158,25 +150,9 @@ class N2:
         """
         from NEMO v3.6
         """
-        # default value: Vallis 2006
-        a0      = 1.6550e-1    # thermal expansion coeff.
-        b0      = 7.6554e-1    # saline  expansion coeff.
-        lambda1 = 5.9520e-2    # cabbeling coeff. in T^2
-        lambda2 = 5.4914e-4    # cabbeling coeff. in S^2
-        mu1     = 1.4970e-4    # thermobaric coeff. in T
-        mu2     = 1.1090e-5    # thermobaric coeff. in S
-        nu      = 2.4341e-3    # cabbeling coeff. in theta*salt
-        
-        teos  = thetao - 10.   # pot. temperature anomaly (t-T0)
-        seos  = so - 35.       # abs. salinity anomaly (s-S0)
-
-        zn    = a0 * ( 1. + lambda1*teos + mu1*depth ) + nu*seos
-        za = zn * (1/CONST.rho0)
-        
-        zn    = b0 * ( 1. - lambda2*seos - mu2*depth ) - nu*teos
-        zb  = zn * (1/CONST.rho0)
-        
-        return za, zb
+        return xr.apply_ufunc(nemo_eos_ts_coefs, thetao, so, depth,
+                              output_core_dims=[[], []], dask='parallelized',
+                              output_dtypes=[np.float64, np.float64])
 
 
 class N2_lowerlimit:
@@ -189,8 +165,7 @@ class N2_lowerlimit:
     unit_long = 'per second squared'
 
     def calculate(depth):
-        p      = CONST.g*CONST.rho0*depth
-        N2_min = (0.25 + 0.75*(np.exp(-(p/10**4)/1000))) * 1e-7
+        N2_min = (0.25 + 0.75*(np.exp(-_pressure(depth)/1000))) * 1e-7
         
         return N2_min / (4*np.pi**2)
 
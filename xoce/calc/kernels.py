@@ -0,0 +1,128 @@
+"""
+Compiled numerical kernels used by the formulas.
+
+Kernels live in a regular module (and not in the 'formulas' directory) so that
+they are compiled once per session rather than every time a CalcManager loads
+its formulas.
+"""
+
+from math import isnan, nan, sqrt
+
+import numba
+from numba import float64
+
+from xoce.calc.formulas.constants import CONST
+
+
+# fastmath without the 'nnan' flag: land points are NaN in ocean outputs
+_FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+
+_G    = CONST.g
+_RHO0 = CONST.rho0
+
+
+@numba.vectorize([float64(float64, float64, float64)], target='parallel',
+                 fastmath=_FASTMATH)
+def teos10_rho(sa, ct, p):
+    """
+    In-situ density [kg m-3] from the 75-term polynomial of TEOS-10
+    (Roquet et al., 2015), same expression as gsw.density.rho.
+
+    sa : absolute salinity [g kg-1]
+    ct : conservative temperature [degrees C]
+    p  : sea pressure [dbar]
+    """
+    xs = sqrt(0.0248826675584615*sa + 5.971840214030754e-1)
+    ys = ct * 0.025
+    z  = p * 1e-4
+
+    v = (1.0769995862e-3
+        + xs*(-3.1038981976e-4 + xs*(6.6928067038e-4 + xs*(-8.5047933937e-4
+        + xs*(5.8086069943e-4 + xs*(-2.1092370507e-4 + 3.1932457305e-5*xs)))))
+        + ys*(-1.5649734675e-5 + xs*(3.5009599764e-5 + xs*(-4.3592678561e-5
+        + xs*(3.4532461828e-5 + xs*(-1.1959409788e-5 + 1.3864594581e-6*xs))))
+        + ys*(2.7762106484e-5 + xs*(-3.7435842344e-5 + xs*(3.5907822760e-5
+        + xs*(-1.8698584187e-5 + 3.8595339244e-6*xs)))
+        + ys*(-1.6521159259e-5 + xs*(2.4141479483e-5 + xs*(-1.4353633048e-5
+        + 2.2863324556e-6*xs))
+        + ys*(6.9111322702e-6 + xs*(-8.7595873154e-6 + 4.3703680598e-6*xs)
+        + ys*(-8.0539615540e-7 - 3.3052758900e-7*xs + 2.0543094268e-7*ys)))))
+        + z*(-6.0799143809e-5 + xs*(2.4262468747e-5 + xs*(-3.4792460974e-5
+        + xs*(3.7470777305e-5 + xs*(-1.7322218612e-5 + 3.0927427253e-6*xs))))
+        + ys*(1.8505765429e-5 + xs*(-9.5677088156e-6 + xs*(1.1100834765e-5
+        + xs*(-9.8447117844e-6 + 2.5909225260e-6*xs)))
+        + ys*(-1.1716606853e-5 + xs*(-2.3678308361e-7 + xs*(2.9283346295e-6
+        - 4.8826139200e-7*xs))
+        + ys*(7.9279656173e-6 + xs*(-3.4558773655e-6 + 3.1655306078e-7*xs)
+        + ys*(-3.4102187482e-6 + 1.2956717783e-6*xs + 5.0736766814e-7*ys))))
+        + z*(9.9856169219e-6 + xs*(-5.8484432984e-7 + xs*(-4.8122251597e-6
+        + xs*(4.9263106998e-6 - 1.7811974727e-6*xs)))
+        + ys*(-1.1736386731e-6 + xs*(-5.5699154557e-6 + xs*(5.4620748834e-6
+        - 1.3544185627e-6*xs))
+        + ys*(2.1305028740e-6 + xs*(3.9137387080e-7 - 6.5731104067e-7*xs)
+        + ys*(-4.6132540037e-7 + 7.7618888092e-9*xs - 6.3352916514e-8*ys)))
+        + z*(-1.1309361437e-6 + xs*(3.6310188515e-7 + 1.6746303780e-8*xs)
+        + ys*(-3.6527006553e-7 - 2.7295696237e-7*xs + 2.8695905159e-7*ys)
+        + z*(1.0531153080e-7 - 1.1147125423e-7*xs + 3.1454099902e-7*ys
+        + z*(-1.2647261286e-8 + 1.9613503930e-9*z))))))
+
+    return 1. / v
+
+
+@numba.guvectorize([(float64, float64, float64, float64[:], float64[:])],
+                   '(),(),()->(),()', target='parallel', fastmath=_FASTMATH)
+def nemo_eos_ts_coefs(thetao, so, depth, za, zb):
+    """
+    Thermal and haline expansion coefficients of the simplified equation of
+    state from NEMO v3.6 (Vallis 2006 default values), in a single pass.
+    """
+    a0      = 1.6550e-1    # thermal expansion coeff.
+    b0      = 7.6554e-1    # saline  expansion coeff.
+    lambda1 = 5.9520e-2    # cabbeling coeff. in T^2
+    lambda2 = 5.4914e-4    # cabbeling coeff. in S^2
+    mu1     = 1.4970e-4    # thermobaric coeff. in T
+    mu2     = 1.1090e-5    # thermobaric coeff. in S
+    nu      = 2.4341e-3    # cabbeling coeff. in theta*salt
+
+    teos  = thetao - 10.   # pot. temperature anomaly (t-T0)
+    seos  = so - 35.       # abs. salinity anomaly (s-S0)
+
+    za[0] = ( a0 * ( 1. + lambda1*teos + mu1*depth ) + nu*seos ) / _RHO0
+    zb[0] = ( b0 * ( 1. - lambda2*seos - mu2*depth ) - nu*teos ) / _RHO0
+
+
+@numba.guvectorize([(float64[:], float64[:], float64[:], float64[:], float64[:],
+                     float64[:], float64[:])],
+                   '(n),(n),(n),(n),(n),(n)->(n)', target='parallel',
+                   fastmath=_FASTMATH)
+def nemo_bn2(za, zb, thetao, so, rw, e3t, bn2):
+    """
+    Brunt Vaisala frequency squared along one water column from NEMO 3.6
+    (SUBROUTINE bn2 in eosbn2.F90), from the thermal and haline expansion
+    coefficients at T-points and the weights rw of the upper level.
+    The surface level and the one above the bottom level are set to zero.
+    Columns with less than two levels are set to NaN.
+    """
+    n = thetao.shape[0]
+
+    # no backward difference without at least two levels
+    if n < 2:
+        bn2[:] = nan
+        return
+
+    for k in range(n):
+        ku = max(k-1, 0)        # level above (surface coefs used at k=0)
+        kd = max(k, 1)          # backward difference (first one used at k=0)
+
+        alpha = za[ku] * (1 - rw[k]) + za[k] * rw[k]
+        beta  = zb[ku] * (1 - rw[k]) + zb[k] * rw[k]
+
+        dT = thetao[kd] - thetao[kd-1]
+        dS = so[kd] - so[kd-1]
+
+        bn2[k] = -1*_G * ( alpha * dT - beta * dS ) / e3t[k]
+
+    # filter top / bottom boundaries
+    for k in (0, n-2):
+        if not isnan(bn2[k]):
+            bn2[k] = 0.
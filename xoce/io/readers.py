@@ -75,7 +75,7 @@ class H5pyReader(XoceObject):
                         dname = 'dim_{}'.format(i)
                         if dname in ds.dims:
                             for d in ds.dims:
-                                if grp[v].shape[i] == ds.dims[d]:
+                                if grp[v].shape[i] == ds.sizes[d]:
                                     dname = d
                     dims.append(dname)
 
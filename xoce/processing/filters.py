@@ -84,7 +84,7 @@ class AverageFilter(XoceObject):
 
         for v in variables:
             iscalc = isinstance(ds, xp.Experiment) and not ds._calc.is_calculable(v)
-            if v not in ds.variables and not iscalc :
+            if v not in ds and not iscalc :
                 continue
 
             if not (v in ds.coords) and self.dim in ds[v].dims:
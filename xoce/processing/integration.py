@@ -39,7 +39,7 @@ class Integral(XoceObject):
                 #            "is not in dataset dimensions {}".format(list(ds.coords)))
 
         for var in self.variables:
-            if var not in ds.variables:
+            if var not in ds:
                 raise Exception("Integral error: '{}' ".format(var) + 
                         "is not in dataset variables {}".format(list(ds.variables)))
 
@@ -126,7 +126,7 @@ class FieldSelector(XoceObject):
         ds = self.dataset
 
         for var in self.variables:
-            if var not in ds.variables:
+            if var not in ds:
                 raise Exception("Selector error: '{}' ".format(var) + 
                         "is not in dataset coordinates ()".format(list(ds.variables)))
 
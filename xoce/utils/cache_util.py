@@ -0,0 +1,35 @@
+"""
+"""
+
+from collections import OrderedDict
+
+
+class BoundedCache:
+    """
+    Small mapping keeping at most `maxsize` entries: the least recently used
+    entry is dropped first when a new one is stored.
+    """
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._data   = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
@@ -224,24 +224,17 @@ def get_dim_axis(dataset, dim_names, skip_notfound=False):
 
 def broadcast_like(model, da:xr.DataArray):
     """
-    Returns a new xr.DataArray with the exact same shape as `model` 
+    Returns a xr.DataArray with the exact same shape as `model` 
     and fill with the values of `da`.
+
+    The result is a read-only broadcast view of `da` (no copy): it keeps
+    the dtype of `da`, not the one of `model`, and must not be written
+    into. Use `.copy()` on it if a writable array is needed.
     """
-    res = xr.full_like(model, 0)
-    res.name = da.name
-    res.attrs = da.attrs
-    
-    rshape   = [1] * len(res.shape)
-    zaxis    = get_dim_axis(res, ['depth'])[0][0]
-    rshape[zaxis] = res.shape[zaxis]
-    
-    for d in res.dims:
-        if d not in da.dims:
-            da = da.expand_dims({d: 1})
-    da = da.transpose(*list(res.dims))
+    # values are matched by dimension names only (da coordinates are dropped)
+    da = xr.DataArray(da.variable, name=da.name)
+    _, res = xr.broadcast(model, da)
 
-    res[:] = da[:]
-    
     return res
 
 